@@ -0,0 +1,16 @@
+"""Gunicorn configuration for Railway/Heroku deployment"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 120
+
+# Import the app (and load the face encoding index) once in the master
+# process; forked workers then share the read-only encoding matrices
+# copy-on-write instead of each re-reading MongoDB/pickle on boot.
+# Anything that can't cross a fork - background threads and pymongo
+# clients - is created lazily per process inside the app instead.
+preload_app = True
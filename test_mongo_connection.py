@@ -3,8 +3,8 @@ Quick test script to verify MongoDB Atlas connection
 Run this before migration to ensure connection works
 """
 
-from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from mongo_config import MongoDBConfig
 import sys
 
 def test_connection(connection_string):
@@ -24,34 +24,28 @@ def test_connection(connection_string):
     print("\nAttempting to connect...")
     
     try:
-        # Try to connect
-        client = MongoClient(connection_string, serverSelectionTimeoutMS=10000)
-        
-        # Verify connection
-        client.admin.command('ping')
-        
+        # Connect through the shared helper so the test exercises the same
+        # pooled client and cheap 'hello' probe the application uses,
+        # instead of a second raw MongoClient plus a heavy server_info call
+        mongo = MongoDBConfig(connection_string)
+
         print("\n✓ SUCCESS! Connected to MongoDB Atlas")
-        
-        # Show server info
-        info = client.server_info()
-        print(f"\nMongoDB Version: {info['version']}")
-        
+
         # List databases
-        databases = client.list_database_names()
+        databases = mongo.client.list_database_names()
         print(f"Available databases: {databases}")
-        
+
         # Test database operations
-        db = client['face_recognition_db']
         print(f"\n✓ Database 'face_recognition_db' ready")
-        
+
         # List collections
-        collections = db.list_collection_names()
+        collections = mongo.db.list_collection_names()
         if collections:
             print(f"Existing collections: {collections}")
         else:
             print("No collections yet (will be created during migration)")
-        
-        client.close()
+
+        mongo.close(shutdown=True)
         
         print("\n" + "="*70)
         print(" CONNECTION TEST PASSED!")
@@ -17,8 +17,8 @@ Directory structure:
 """
 
 import os
-from mongo_config import MongoDBConfig
-import face_recognition
+from concurrent.futures import ProcessPoolExecutor
+from mongo_config import MongoDBConfig, encode_image_file, IMAGE_EXTENSIONS
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -54,56 +54,45 @@ def upload_dataset_to_mongo():
     
     total_uploaded = 0
     total_people = 0
-    
-    # Process each person's folder
-    for person_folder in dataset_path.iterdir():
-        if not person_folder.is_dir():
-            continue
-        
-        person_name = person_folder.name
-        print(f"\n👤 Processing: {person_name}")
-        
-        # Add user to MongoDB if not exists
-        user = mongo_db.get_user_by_name(person_name)
-        if not user:
-            mongo_db.add_user(person_name)
-        
-        person_count = 0
-        
-        # Process each image
-        for image_file in person_folder.iterdir():
-            if image_file.suffix.lower() not in ['.jpg', '.jpeg', '.png']:
+
+    # Encoding is CPU-bound, so images encode concurrently across cores
+    # while this process handles the (bulk) MongoDB writes
+    with ProcessPoolExecutor() as pool:
+        # Process each person's folder
+        for person_folder in dataset_path.iterdir():
+            if not person_folder.is_dir():
                 continue
-            
-            try:
-                print(f"   📸 Processing: {image_file.name}...", end=" ")
-                
-                # Load image and get face encoding
-                image = face_recognition.load_image_file(str(image_file))
-                encodings = face_recognition.face_encodings(image, model='large')
-                
-                if len(encodings) == 0:
-                    print("⚠️  No face found")
+
+            person_name = person_folder.name
+            print(f"\n👤 Processing: {person_name}")
+
+            # User creation is handled (and cached) by the bulk save below
+
+            image_paths = [str(image_file) for image_file in person_folder.iterdir()
+                           if image_file.suffix.lower() in IMAGE_EXTENSIONS]
+
+            person_encodings = []
+            person_images = []
+
+            for image_name, encoding in pool.map(encode_image_file, image_paths):
+                if encoding is None:
+                    print(f"   ⚠️  No face found in {image_name}")
                     continue
-                
-                # Save to MongoDB
-                encoding = encodings[0]
-                mongo_db.save_face_encoding(person_name, encoding, image_file.name)
-                
-                print("✅")
-                person_count += 1
-                total_uploaded += 1
-                
-            except Exception as e:
-                print(f"❌ Error: {e}")
-                continue
-        
-        if person_count > 0:
-            print(f"   ✅ Uploaded {person_count} encodings for {person_name}")
-            total_people += 1
-        else:
-            print(f"   ⚠️  No valid faces found for {person_name}")
-    
+                person_encodings.append(encoding)
+                person_images.append(image_name)
+                print(f"   📸 {image_name} ✅")
+
+            # Upload the whole person in one bulk insert instead of per-image
+            person_count = mongo_db.save_face_encodings_bulk(
+                person_name, person_encodings, person_images)
+            total_uploaded += person_count
+
+            if person_count > 0:
+                print(f"   ✅ Uploaded {person_count} encodings for {person_name}")
+                total_people += 1
+            else:
+                print(f"   ⚠️  No valid faces found for {person_name}")
+
     # Summary
     print("\n" + "="*50)
     print(f"✅ Upload Complete!")
@@ -6,6 +6,7 @@ This script displays all data stored in MongoDB including:
 - Access Logs
 """
 
+import argparse
 import os
 from mongo_config import MongoDBConfig
 from datetime import datetime
@@ -47,31 +48,30 @@ def view_face_encodings(mongo_db):
     """Display face encodings statistics"""
     print_header("FACE ENCODINGS")
     
-    # Get all encodings
-    cursor = mongo_db.encodings_collection.find()
-    encodings_list = list(cursor)
-    
-    if len(encodings_list) == 0:
+    # Group server-side: one aggregation returns a row per user instead of
+    # shipping every encoding document to the client to group in Python
+    pipeline = [
+        {'$group': {
+            '_id': '$user_name',
+            'count': {'$sum': 1},
+            'last_updated': {'$max': '$created_at'}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+    user_rows = list(mongo_db.encodings_collection.aggregate(pipeline))
+
+    if len(user_rows) == 0:
         print("No face encodings found in database.")
         return
-    
-    # Group by user
-    user_encodings = {}
-    for enc in encodings_list:
-        user_name = enc['user_name']
-        if user_name not in user_encodings:
-            user_encodings[user_name] = []
-        user_encodings[user_name].append(enc)
-    
-    print(f"\nTotal Encodings: {len(encodings_list)}")
-    print(f"Total Users: {len(user_encodings)}\n")
-    
+
+    print(f"\nTotal Encodings: {sum(row['count'] for row in user_rows)}")
+    print(f"Total Users: {len(user_rows)}\n")
+
     print(f"{'User Name':<25} {'Encodings':<12} {'Last Updated':<20}")
     print("-" * 80)
-    
-    for user_name, encodings in sorted(user_encodings.items()):
-        latest_date = max([enc['created_at'] for enc in encodings])
-        print(f"{user_name:<25} {len(encodings):<12} {latest_date.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    for row in user_rows:
+        print(f"{row['_id']:<25} {row['count']:<12} {row['last_updated'].strftime('%Y-%m-%d %H:%M:%S')}")
     
     print("\n" + "-" * 80)
     print("Note: Each user should have multiple encodings (from different images)")
@@ -87,7 +87,10 @@ def view_access_logs(mongo_db, limit=20):
         print("No access logs found in database.")
         return
     
-    print(f"\nTotal Logs in Database: {mongo_db.access_logs_collection.count_documents({})}")
+    # One $facet aggregation gives all three counts in a single round-trip
+    stats = mongo_db.get_access_stats()
+
+    print(f"\nTotal Logs in Database: {stats['total']}")
     print(f"Showing last {len(logs)} entries:\n")
     
     print(f"{'#':<4} {'Timestamp':<20} {'User Name':<20} {'Status':<10} {'Confidence':<12}")
@@ -95,18 +98,20 @@ def view_access_logs(mongo_db, limit=20):
     
     for idx, log in enumerate(logs, 1):
         timestamp = log['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-        user_name = log['user_name']
-        status = log['status']
+        # Defaults guard against stray documents (e.g. server events that
+        # older versions wrote into this collection)
+        user_name = log.get('user_name', 'N/A')
+        status = log.get('status', 'N/A')
         confidence = f"{log.get('confidence', 'N/A')}%" if log.get('confidence') else 'N/A'
-        
+
         print(f"{idx:<4} {timestamp:<20} {user_name:<20} {status:<10} {confidence:<12}")
     
     print("\n" + "-" * 80)
     
     # Statistics
-    total_opened = mongo_db.access_logs_collection.count_documents({'status': 'opened'})
-    total_denied = mongo_db.access_logs_collection.count_documents({'status': 'denied'})
-    
+    total_opened = stats['opened']
+    total_denied = stats['denied']
+
     print(f"\nStatistics:")
     print(f"  Total Opened: {total_opened}")
     print(f"  Total Denied: {total_denied}")
@@ -116,9 +121,11 @@ def view_database_stats(mongo_db):
     """Display overall database statistics"""
     print_header("DATABASE OVERVIEW")
     
-    user_count = mongo_db.users_collection.count_documents({})
-    encoding_count = mongo_db.encodings_collection.count_documents({})
-    log_count = mongo_db.access_logs_collection.count_documents({})
+    # estimated_document_count reads collection metadata instead of
+    # scanning; an overview doesn't need point-in-time-exact numbers
+    user_count = mongo_db.users_collection.estimated_document_count()
+    encoding_count = mongo_db.encodings_collection.estimated_document_count()
+    log_count = mongo_db.access_logs_collection.estimated_document_count()
     
     print(f"\n{'Category':<30} {'Count':<15}")
     print("-" * 50)
@@ -149,13 +156,91 @@ def search_user_logs(mongo_db, user_name):
     
     for idx, log in enumerate(logs, 1):
         timestamp = log['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-        status = log['status']
+        status = log.get('status', 'N/A')
         confidence = f"{log.get('confidence', 'N/A')}%" if log.get('confidence') else 'N/A'
         
         print(f"{idx}. {timestamp} - Status: {status} - Confidence: {confidence}")
 
+def run_command(mongo_db, command, limit=20, user=None):
+    """Dispatch one viewer command"""
+    if command == 'overview':
+        view_database_stats(mongo_db)
+    elif command == 'users':
+        view_users(mongo_db)
+    elif command == 'encodings':
+        view_face_encodings(mongo_db)
+    elif command == 'logs':
+        view_access_logs(mongo_db, limit=limit)
+    elif command == 'search':
+        search_user_logs(mongo_db, user)
+    elif command == 'all':
+        view_database_stats(mongo_db)
+        view_users(mongo_db)
+        view_face_encodings(mongo_db)
+        view_access_logs(mongo_db, limit=limit)
+
+def interactive_menu(mongo_db):
+    """Legacy interactive menu, used when no command is given"""
+    while True:
+        print("\n" + "=" * 80)
+        print(" MONGODB DATABASE VIEWER")
+        print("=" * 80)
+        print("\nOptions:")
+        print("  1. View Database Overview")
+        print("  2. View All Users/Dataset")
+        print("  3. View Face Encodings")
+        print("  4. View Access Logs (last 20)")
+        print("  5. View Access Logs (last 50)")
+        print("  6. Search User Access Logs")
+        print("  7. View Everything")
+        print("  0. Exit")
+        print()
+
+        choice = input("Enter your choice (0-7): ").strip()
+
+        if choice == '1':
+            run_command(mongo_db, 'overview')
+        elif choice == '2':
+            run_command(mongo_db, 'users')
+        elif choice == '3':
+            run_command(mongo_db, 'encodings')
+        elif choice == '4':
+            run_command(mongo_db, 'logs', limit=20)
+        elif choice == '5':
+            run_command(mongo_db, 'logs', limit=50)
+        elif choice == '6':
+            user_name = input("Enter user name: ").strip()
+            if user_name:
+                run_command(mongo_db, 'search', user=user_name)
+            else:
+                print("Invalid user name!")
+        elif choice == '7':
+            run_command(mongo_db, 'all')
+        elif choice == '0':
+            print("\nExiting...")
+            break
+        else:
+            print("Invalid choice! Please try again.")
+
+        input("\nPress Enter to continue...")
+
 def main():
     """Main function"""
+    # One-shot dispatch: `python view_mongodb_data.py logs --limit 50`
+    # runs a single view and exits, which is scriptable and skips the
+    # menu rerender between every action; no command opens the old menu
+    parser = argparse.ArgumentParser(description='View MongoDB database contents')
+    parser.add_argument('command', nargs='?',
+                        choices=['overview', 'users', 'encodings', 'logs', 'search', 'all'],
+                        help='View to display (omit for the interactive menu)')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='Number of access-log entries to show (default: 20)')
+    parser.add_argument('--user', help="User name for the 'search' command")
+    args = parser.parse_args()
+
+    if args.command == 'search' and not args.user:
+        parser.error("the 'search' command requires --user")
+
     try:
         # Connect to MongoDB
         connection_string = os.getenv('MONGO_URI')
@@ -164,56 +249,15 @@ def main():
         else:
             print("Using default MongoDB connection...")
             mongo_db = MongoDBConfig()
-        
-        while True:
-            print("\n" + "=" * 80)
-            print(" MONGODB DATABASE VIEWER")
-            print("=" * 80)
-            print("\nOptions:")
-            print("  1. View Database Overview")
-            print("  2. View All Users/Dataset")
-            print("  3. View Face Encodings")
-            print("  4. View Access Logs (last 20)")
-            print("  5. View Access Logs (last 50)")
-            print("  6. Search User Access Logs")
-            print("  7. View Everything")
-            print("  0. Exit")
-            print()
-            
-            choice = input("Enter your choice (0-7): ").strip()
-            
-            if choice == '1':
-                view_database_stats(mongo_db)
-            elif choice == '2':
-                view_users(mongo_db)
-            elif choice == '3':
-                view_face_encodings(mongo_db)
-            elif choice == '4':
-                view_access_logs(mongo_db, limit=20)
-            elif choice == '5':
-                view_access_logs(mongo_db, limit=50)
-            elif choice == '6':
-                user_name = input("Enter user name: ").strip()
-                if user_name:
-                    search_user_logs(mongo_db, user_name)
-                else:
-                    print("Invalid user name!")
-            elif choice == '7':
-                view_database_stats(mongo_db)
-                view_users(mongo_db)
-                view_face_encodings(mongo_db)
-                view_access_logs(mongo_db, limit=20)
-            elif choice == '0':
-                print("\nExiting...")
-                break
-            else:
-                print("Invalid choice! Please try again.")
-            
-            input("\nPress Enter to continue...")
-        
-        # Close connection
-        mongo_db.close()
-        
+
+        if args.command:
+            run_command(mongo_db, args.command, limit=args.limit, user=args.user)
+        else:
+            interactive_menu(mongo_db)
+
+        # Close connection (one-shot script, so actually shut it down)
+        mongo_db.close(shutdown=True)
+
     except Exception as e:
         print(f"\n✗ Error: {e}")
         import traceback